@@ -1,6 +1,14 @@
+import hashlib
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import numpy as np
+import polars as pl
 import altair as alt
 
 # ------------------------------
@@ -25,66 +33,268 @@ CATEGORY_ORDER = [
     "Kelembagaan",
 ]
 
+# Posisi tiap kategori di CATEGORY_ORDER (= kode categorical kolom `category`)
+_CAT_ORDER = {c: i for i, c in enumerate(CATEGORY_ORDER)}
+
+# Kolom tabel compare (tab 5) yang ditampilkan, sesuai urutan
+COMPARE_COLUMNS = [
+    "code",
+    "name",
+    "category",   # ini = area, misalnya Publikasi / Penelitian / dll
+    "score_selected",
+    "score_compare",
+    "diff_abs",
+    "diff_pct",
+]
+
+# File lokal yang dipakai kalau user tidak upload
+LOCAL_CLUSTER_FILE = "Sinta Metric Cluster.xlsx"
+LOCAL_METRICS_FILES = ["Sinta Metrics Detail v2.1.xlsx", "Sinta Metrics Detail.xlsx"]
+
+# Folder cache Parquet hasil konversi dari xlsx (satu subfolder per versi file),
+# di samping app ini (bukan di CWD proses). Hanya subfolder terbaru yang disimpan:
+# 4 entri per loader, sama dengan max_entries cache loader.
+PARQUET_CACHE_DIR = Path(__file__).parent / ".cache"
+PARQUET_CACHE_MAX_DIRS = 8
+
 
 # ------------------------------
 # Fungsi Load & Preprocess Data
 # ------------------------------
 
-@st.cache_data
-def load_cluster_data(file):
-    """Load Sinta Metric Cluster.xlsx dan siapkan afiliasi + detail kode."""
-    xls = pd.read_excel(file, sheet_name=None)
+def _source_key(file):
+    """Kunci versi file sumber: mtime+size untuk path lokal, hash isi untuk file upload."""
+    if isinstance(file, (str, Path)):
+        path = Path(file)
+        stat = path.stat()
+        raw = f"{path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}".encode()
+    else:
+        raw = file.getvalue()
+    return hashlib.md5(raw).hexdigest()
+
+
+def _prune_parquet_cache(current_dir):
+    """Hapus subfolder cache Parquet lama, sisakan `PARQUET_CACHE_MAX_DIRS` yang terbaru."""
+    dirs = [
+        d for d in PARQUET_CACHE_DIR.iterdir()
+        if d.is_dir() and d != current_dir
+    ]
+    dirs.sort(key=lambda d: d.stat().st_mtime, reverse=True)
+    # Folder yang baru ditulis ikut dihitung sebagai salah satu yang disimpan
+    for d in dirs[PARQUET_CACHE_MAX_DIRS - 1:]:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def _load_sheets_cached(file, source_key):
+    """
+    Baca semua sheet dari file Excel, lewat cache Parquet di
+    `<folder app>/.cache/<hash>/<sheet>.parquet`.
+    Parsing xlsx (openpyxl) hanya dilakukan sekali per versi file; selanjutnya dibaca dari Parquet.
+    Setiap kali folder baru ditulis, folder versi lama dipangkas (`_prune_parquet_cache`).
+    """
+    cache_dir = PARQUET_CACHE_DIR / source_key
+    manifest = cache_dir / "sheets.json"
+
+    if manifest.exists():
+        try:
+            sheet_names = json.loads(manifest.read_text())
+            return {
+                name: pd.read_parquet(cache_dir / f"{name}.parquet", engine="pyarrow")
+                for name in sheet_names
+            }
+        except Exception:
+            # Cache rusak / tidak lengkap: baca ulang dari xlsx
+            pass
+
+    xls = pd.read_excel(file, sheet_name=None, engine="openpyxl")
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for name, df in xls.items():
+            df.to_parquet(
+                cache_dir / f"{name}.parquet", engine="pyarrow", compression="snappy"
+            )
+        # Manifest ditulis terakhir sebagai penanda cache sudah lengkap (urutan sheet ikut disimpan)
+        manifest.write_text(json.dumps(list(xls.keys())))
+        _prune_parquet_cache(cache_dir)
+    except Exception:
+        # Cache hanya optimasi; kalau gagal ditulis tetap pakai hasil xlsx
+        pass
+
+    return xls
+
+
+def _downcast_numeric(df, float32_cols=()):
+    """
+    int64 -> integer terkecil yang muat; float64 -> float32 hanya untuk `float32_cols`.
+    float32 cuma ~7 digit signifikan, jadi skor besar (jutaan, tampil 2 desimal) tetap float64.
+    """
+    for c in float32_cols:
+        df[c] = df[c].astype("float32")
+    for c in df.select_dtypes("int64").columns:
+        df[c] = pd.to_numeric(df[c], downcast="integer")
+    return df
+
 
-    df_af = xls["afiliasi"].copy()
-    df_detail = xls["detail_kode"].copy()
+# Loader mengembalikan `source_key` (versi file sumber) bersama frame-nya.
+# Helper ber-`st.cache_data` di bawah menerima frame hasil loader sebagai argumen
+# berawalan `_` (tidak di-hash Streamlit) plus `source_key` eksplisit sebagai kunci
+# cache. Jadi frame yang dioper harus persis frame loader untuk `source_key` tersebut;
+# jangan oper frame turunan (hasil filter/assign) ke helper ini.
+
+
+# Loader ikut disimpan ke disk supaya restart server tidak perlu memproses ulang file
+# (spinner ditampilkan dari main(), karena loader dijalankan di thread terpisah).
+# Cache persist tidak mendukung ttl, jadi untuk file lokal `source_key` (mtime+size)
+# dioper sebagai argumen: begitu file berubah, kunci cache ikut berubah.
+@st.cache_data(persist="disk", show_spinner=False, max_entries=4)
+def load_cluster_data(file, source_key=None):
+    """
+    Load Sinta Metric Cluster.xlsx dan siapkan afiliasi + detail kode.
+    Elemen terakhir hasilnya adalah `source_key` file tersebut.
+    """
+    source_key = source_key or _source_key(file)
+    xls = _load_sheets_cached(file, source_key)
+
+    df_af = xls["afiliasi"]
+    df_detail = xls["detail_kode"]
 
     # Tambahkan label kategori yang lebih simple
     df_detail["category"] = df_detail["kategori_score"].map(CATEGORY_LABELS)
 
-    # Agregasi total per kategori per afiliasi
+    # Agregasi total per kategori per afiliasi (Polars, multi-threaded);
+    # hanya kolom yang dibutuhkan yang dikonversi, balik ke pandas di akhir
     cat_pivot = (
-        df_detail
-        .groupby(["nama_afiliasi", "category"])["total"]
-        .sum()
-        .unstack(fill_value=0)
+        pl.from_pandas(df_detail[["nama_afiliasi", "category", "total"]])
+        .drop_nulls(["nama_afiliasi", "category"])
+        .group_by(["nama_afiliasi", "category"])
+        .agg(pl.col("total").sum())
+        .pivot(on="category", index="nama_afiliasi", values="total", sort_columns=True)
+        .fill_null(0)
+        .sort("nama_afiliasi")
+        .to_pandas()
+        .set_index("nama_afiliasi")
     )
-
-    # Hitung rank nasional berdasarkan sinta_score_overall
-    af_ranked = df_af.sort_values("sinta_score_overall", ascending=False).reset_index(drop=True)
-    af_ranked["rank_overall"] = af_ranked.index + 1
-
-    df_af = df_af.merge(
-        af_ranked[["nama_afiliasi", "rank_overall"]],
-        on="nama_afiliasi",
-        how="left"
+    cat_pivot.columns.name = "category"
+
+    # Top 20 per kategori (total + rank) disiapkan sekali, tab 2 tinggal lookup
+    per_cat_views = {
+        cat: (
+            cat_pivot[[cat]]
+            .rename(columns={cat: "total"})
+            .assign(
+                rank_in_category=lambda d: d["total"]
+                .rank(ascending=False, method="min")
+                .astype("int32")
+            )
+            .sort_values("total", ascending=False)
+            .head(20)
+            .reset_index()
+        )
+        for cat in cat_pivot.columns
+    }
+
+    # Hitung rank nasional berdasarkan sinta_score_overall (tanpa sort + merge)
+    # (skor kosong ditaruh di peringkat paling bawah, sama seperti sort)
+    scores = df_af["sinta_score_overall"].to_numpy(dtype="float64")
+    df_af["rank_overall"] = (
+        df_af["sinta_score_overall"]
+        .rank(method="first", ascending=False, na_option="bottom")
+        .astype("int32")
     )
 
-    # Hitung score minimal Top 10 dan gap ke Top 10
+    # Hitung score minimal Top 10 dan gap ke Top 10 (hanya dari skor yang terisi)
     top10_threshold = None
-    if len(af_ranked) >= 10:
-        top10_threshold = af_ranked.loc[9, "sinta_score_overall"]
+    valid_scores = scores[~np.isnan(scores)]
+    if len(valid_scores) >= 10:
+        # Seleksi O(n) untuk skor peringkat 10, tidak perlu sort penuh
+        top10_threshold = np.partition(valid_scores, -10)[-10]
         df_af["gap_to_top10"] = np.where(
-            df_af["rank_overall"] <= 10,
+            df_af["rank_overall"].to_numpy() <= 10,
             0,
-            top10_threshold - df_af["sinta_score_overall"]
+            top10_threshold - scores
         )
     else:
         df_af["gap_to_top10"] = np.nan
 
-    return df_af, df_detail, cat_pivot, top10_threshold
+    _downcast_numeric(df_af)
+    # weight/value/total per kode kecil (value 0–1), aman di float32
+    _downcast_numeric(df_detail, float32_cols=("weight", "value", "total"))
+
+    # Kolom string yang berulang -> categorical (hemat memori, filter jadi perbandingan int)
+    for c in ("nama_afiliasi", "kode", "kategori_score"):
+        df_detail[c] = df_detail[c].astype("category")
+    # Kode categorical `category` = indeks di CATEGORY_ORDER (dipakai simulasi)
+    df_detail["category"] = pd.Categorical(df_detail["category"], categories=CATEGORY_ORDER)
+
+    # Index per afiliasi (sorted, stabil) supaya filter per afiliasi jadi lookup index
+    df_detail = df_detail.set_index("nama_afiliasi").sort_index(kind="stable")
+
+    # Mapping code -> category (untuk tab selain compare), di-index per code
+    code_cat_map = (
+        df_detail[["kode", "kategori_score", "category"]]
+        .drop_duplicates()
+        .rename(columns={"kode": "code"})
+        .set_index("code")
+    )
+
+    return (
+        df_af, df_detail, cat_pivot, per_cat_views, top10_threshold, code_cat_map, source_key
+    )
 
 
-@st.cache_data
-def load_metrics_detail(file):
-    """Load Sinta Metrics Detail.xlsx (sheet metrics_details)."""
-    xls = pd.read_excel(file, sheet_name=None)
+@st.cache_data(persist="disk", show_spinner=False, max_entries=4)
+def load_metrics_detail(file, source_key=None):
+    """Load Sinta Metrics Detail.xlsx (sheet metrics_details). Return (df_md, source_key)."""
+    source_key = source_key or _source_key(file)
+    xls = _load_sheets_cached(file, source_key)
     if "metrics_details" in xls:
-        df = xls["metrics_details"].copy()
+        df = xls["metrics_details"]
     else:
         # fallback: ambil sheet pertama jika nama sheet beda
         first_sheet_name = list(xls.keys())[0]
-        df = xls[first_sheet_name].copy()
-    return df
+        df = xls[first_sheet_name]
+
+    _downcast_numeric(df)
+
+    # Kolom pencarian (code + nama, lowercase) untuk filter teks di tab 4;
+    # string Arrow supaya `str.contains` jalan di kernel pyarrow
+    df["_search"] = (
+        df["code"].astype(str) + "\x1f" + df["name"].astype(str)
+    ).str.lower().astype("string[pyarrow]")
+
+    # Nama afiliasi dinormalisasi ke huruf besar sekali di sini; lookup per tab
+    # cukup pakai kunci dari `_affiliation_options` tanpa .upper() tiap klik
+    df["affiliation_name"] = df["affiliation_name"].str.upper()
+    for c in ("affiliation_name", "code", "area"):
+        df[c] = df[c].astype("category")
+
+    df = df.set_index("affiliation_name").sort_index(kind="stable")
+    return df, source_key
+
+
+def _rows_for(df, key):
+    """Ambil semua baris untuk satu afiliasi dari frame yang di-index per afiliasi."""
+    if key not in df.index:
+        return df.iloc[0:0].reset_index(drop=True)
+    # list form supaya selalu dapat DataFrame walau cuma satu baris
+    return df.loc[[key]].reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False)
+def _affiliation_options(_df_af, source_key):
+    """
+    Daftar afiliasi (urut) + index default (Universitas Bina Nusantara kalau ada),
+    plus mapping nama tampilan -> kunci afiliasi (huruf besar) di Sinta Metrics Detail.
+    """
+    options = sorted(_df_af["nama_afiliasi"].unique().tolist())
+    default = (
+        options.index("Universitas Bina Nusantara")
+        if "Universitas Bina Nusantara" in options
+        else 0
+    )
+    md_keys = {aff: aff.upper() for aff in options}
+    return options, default, md_keys
 
 
 # ------------------------------
@@ -92,7 +302,10 @@ def load_metrics_detail(file):
 # ------------------------------
 
 def plot_overall_ranking(df_af, selected_affiliation, top_n=15):
-    df = df_af.sort_values("sinta_score_overall", ascending=False).head(top_n).copy()
+    # Kirim ke Altair hanya baris top N + kolom yang dipakai chart
+    df = df_af.nlargest(top_n, "sinta_score_overall")[
+        ["nama_afiliasi", "sinta_score_overall", "rank_overall", "gap_to_top10"]
+    ]
 
     chart = (
         alt.Chart(df)
@@ -117,12 +330,13 @@ def plot_overall_ranking(df_af, selected_affiliation, top_n=15):
     st.altair_chart(chart, use_container_width=True)
 
 
-def plot_category_breakdown(cat_pivot, selected_affiliation):
-    if selected_affiliation not in cat_pivot.index:
-        st.warning("Data kategori tidak ditemukan untuk afiliasi ini.")
-        return
+@st.cache_data(show_spinner=False)
+def _cat_breakdown(_cat_pivot, source_key, selected_affiliation):
+    """Tabel kontribusi per kategori untuk satu afiliasi (None kalau afiliasi tidak ada)."""
+    if selected_affiliation not in _cat_pivot.index:
+        return None
 
-    row = cat_pivot.loc[selected_affiliation]
+    row = _cat_pivot.loc[selected_affiliation]
     df_cat = (
         row.reset_index()
         .rename(columns={"index": "category", 0: "total"})
@@ -131,14 +345,19 @@ def plot_category_breakdown(cat_pivot, selected_affiliation):
     )
 
     df_cat.columns = ["category", "total"]
-    df_cat = df_cat[df_cat["category"].notna()].copy()
-    df_cat["share_percent"] = df_cat["total"] / df_cat["total"].sum() * 100
-    df_cat["category"] = pd.Categorical(
-        df_cat["category"],
-        categories=CATEGORY_ORDER,
-        ordered=True,
+    df_cat = df_cat[df_cat["category"].notna()]
+    df_cat = df_cat.assign(
+        share_percent=df_cat["total"] / df_cat["total"].sum() * 100,
     )
-    df_cat = df_cat.sort_values("category")
+    # Urutkan sesuai CATEGORY_ORDER lewat key numerik (tanpa bikin Categorical tiap panggilan)
+    return df_cat.sort_values("category", key=lambda s: s.map(_CAT_ORDER))
+
+
+def plot_category_breakdown(cat_pivot, source_key, selected_affiliation):
+    df_cat = _cat_breakdown(cat_pivot, source_key, selected_affiliation)
+    if df_cat is None:
+        st.warning("Data kategori tidak ditemukan untuk afiliasi ini.")
+        return
 
     col1, col2 = st.columns(2)
     with col1:
@@ -168,14 +387,14 @@ def plot_category_breakdown(cat_pivot, selected_affiliation):
         st.altair_chart(chart, use_container_width=True)
 
 
-def get_high_leverage_metrics(df_detail, selected_affiliation, top_k=30):
-    df = df_detail[df_detail["nama_afiliasi"] == selected_affiliation].copy()
+@st.cache_data(show_spinner=False)
+def get_high_leverage_metrics(_df_detail, source_key, selected_affiliation, top_k=30):
+    df = _rows_for(_df_detail, selected_affiliation)
     if df.empty:
         return df
 
-    df["category"] = df["kategori_score"].map(CATEGORY_LABELS)
     # Potensi kenaikan: weight * (1 - value)
-    df["potential_gain"] = df["weight"] * (1 - df["value"])
+    df = df.assign(potential_gain=df["weight"] * (1 - df["value"]))
     df = df.sort_values("potential_gain", ascending=False)
 
     return df.head(top_k)
@@ -186,8 +405,9 @@ def plot_high_leverage_bar(df_high):
         st.info("Tidak ada data high-leverage metrics untuk afiliasi ini.")
         return
 
-    chart_data = df_high.copy()
-    chart_data["label"] = chart_data["kode"] + " – " + chart_data["category"]
+    chart_data = df_high[
+        ["kode", "nama", "category", "weight", "value", "total", "potential_gain"]
+    ].assign(label=df_high["kode"].astype(str) + " – " + df_high["category"].astype(str))
 
     chart = (
         alt.Chart(chart_data)
@@ -210,766 +430,825 @@ def plot_high_leverage_bar(df_high):
     st.altair_chart(chart, use_container_width=True)
 
 
-def compare_universities_df(df_md, aff1, aff2, metric_col):
+@st.cache_data(show_spinner=False)
+def _wide_metric(_df_md, source_key, metric_col):
+    """Pivot satu metric: index code, kolom afiliasi (NaN kalau code tidak ada di afiliasi tsb)."""
+    return _df_md.pivot_table(
+        index="code",
+        columns="affiliation_name",
+        values=metric_col,
+        aggfunc="sum",
+        observed=True,
+    )
+
+
+@st.cache_data(show_spinner=False)
+def _code_meta(_df_md, source_key):
+    """Nama indikator & area per code (sama untuk semua afiliasi)."""
+    return _df_md[["code", "name", "area"]].drop_duplicates("code").set_index("code")
+
+
+@st.cache_data(show_spinner=False)
+def _simulate_category_totals(
+    _df_detail, source_key, selected_affiliation, sim_categories, delta_value
+):
+    """
+    Simulasi kenaikan value untuk kategori terpilih (maks 1.0), lalu total per kategori
+    sebelum & sesudah. Dihitung langsung di array NumPy: satu pass + np.bincount per kategori.
+    """
+    df_aff = _rows_for(_df_detail, selected_affiliation)
+
+    codes = df_aff["category"].cat.codes.to_numpy()
+    valid = codes >= 0  # kategori kosong (NaN) tidak ikut diagregasi
+    codes = codes[valid]
+    weight = df_aff["weight"].to_numpy()[valid]
+    value = df_aff["value"].to_numpy()[valid]
+    total = df_aff["total"].to_numpy()[valid]
+
+    in_cats = np.isin(codes, [_CAT_ORDER[c] for c in sim_categories])
+    value_sim = np.where(in_cats, np.minimum(value + delta_value, 1.0), value)
+    total_sim = weight * value_sim
+
+    n_cat = len(CATEGORY_ORDER)
+    present = np.bincount(codes, minlength=n_cat) > 0
+    # NaN dianggap 0, sama seperti groupby().sum()
+    original_total = np.bincount(codes, weights=np.nan_to_num(total), minlength=n_cat)
+    simulated_total = np.bincount(codes, weights=np.nan_to_num(total_sim), minlength=n_cat)
+    change = simulated_total - original_total
+    change_percent = np.divide(
+        change, original_total, out=np.full(n_cat, np.nan), where=original_total > 0
+    ) * 100
+
+    # Urutan bincount sudah mengikuti CATEGORY_ORDER
+    return pd.DataFrame(
+        {
+            "category": CATEGORY_ORDER,
+            "original_total": original_total,
+            "simulated_total": simulated_total,
+            "change": change,
+            "change_percent": change_percent,
+        }
+    )[present].reset_index(drop=True)
+
+
+def compare_universities_df(df_md, source_key, aff1, aff2, metric_col, areas=None):
     """
     Bandingkan dua afiliasi per code, side by side.
     Kategori diambil dari kolom `area` pada Sinta Metrics Detail (Publikasi, Penelitian, dll).
+    Kalau `areas` diisi, hanya code di area tersebut yang dihitung selisihnya.
+    `df_md` harus frame hasil `load_metrics_detail` untuk `source_key` (kunci cache pivot).
     """
-    df1 = df_md[df_md["affiliation_name"] == aff1].copy()
-    df2 = df_md[df_md["affiliation_name"] == aff2].copy()
-
-    # Data A (selected)
-    base = df1[["code", "name", "area", metric_col]].rename(
-        columns={metric_col: "score_selected", "area": "category"}
-    )
-
-    # Data B (compare)
-    comp = df2[["code", "area", metric_col]].rename(
-        columns={metric_col: "score_compare", "area": "category_b"}
+    wide = _wide_metric(df_md, source_key, metric_col)
+    missing = pd.Series(np.nan, index=wide.index)
+    score_a = wide[aff1] if aff1 in wide.columns else missing
+    score_b = wide[aff2] if aff2 in wide.columns else missing
+    meta = _code_meta(df_md, source_key).reindex(wide.index)
+
+    # Hanya code yang ada di salah satu afiliasi (dan di area terpilih);
+    # filter dulu sebelum hitung selisih. Skor yang kosong dihitung 0
+    present = score_a.notna() | score_b.notna()
+    if areas:
+        present &= meta["area"].isin(areas)
+    score_a = score_a[present].fillna(0)
+    score_b = score_b[present].fillna(0)
+
+    # Hitung selisih langsung di array NumPy (tanpa Series perantara);
+    # persen hanya dibagi di posisi score_compare != 0, sisanya NaN
+    a = score_a.to_numpy(np.float64)
+    b = score_b.to_numpy(np.float64)
+    diff_abs = a - b
+    diff_pct = np.divide(diff_abs, b, out=np.full(b.shape, np.nan), where=b != 0)
+    diff_pct *= 100
+
+    df = (
+        meta[present]
+        .rename(columns={"area": "category"})  # tetap categorical
+        .assign(
+            score_selected=a,
+            score_compare=b,
+            diff_abs=diff_abs,
+            diff_pct=diff_pct,
+        )
     )
+    return df.reset_index()
 
-    # Merge per code
-    df = pd.merge(base, comp, on="code", how="outer")
-
-    # Isi nama indikator dari B kalau di A kosong
-    if "name" in df.columns:
-        name_map = df2.set_index("code")["name"]
-        df["name"] = df["name"].fillna(df["code"].map(name_map))
-
-    # Ambil kategori dari A, kalau kosong pakai kategori dari B
-    df["category"] = df["category"].fillna(df["category_b"])
-    df = df.drop(columns=["category_b"])
 
-    # Isi NaN skor dengan 0 supaya bisa dihitung
-    df["score_selected"] = df["score_selected"].fillna(0)
-    df["score_compare"] = df["score_compare"].fillna(0)
+@st.cache_data(show_spinner=False)
+def _compare_cached(_df_md, source_key, aff1, aff2, metric_col, areas, top_n):
+    """
+    Hasil compare yang sudah difilter area dan dipotong top N selisih absolut terbesar
+    (hanya kolom yang ditampilkan), frame CSS warnanya, plus jumlah metric
+    (lebih tinggi, lebih rendah, sama) untuk ringkasan.
+    Di-cache per (data, A, B, metric, area, N) supaya klik ulang tidak menghitung dari awal.
+    """
+    df_comp = compare_universities_df(_df_md, source_key, aff1, aff2, metric_col, areas)
 
-    # Hitung selisih
-    df["diff_abs"] = df["score_selected"] - df["score_compare"]
-    df["diff_pct"] = np.where(
-        df["score_compare"] != 0,
-        df["diff_abs"] / df["score_compare"] * 100,
-        np.nan,
+    # Top N selisih absolut terbesar (partial sort via nlargest, bukan sort penuh)
+    df_comp = (
+        df_comp.assign(_abs=df_comp["diff_abs"].abs())
+        .nlargest(top_n, "_abs")
+        .drop(columns="_abs")
     )
 
-    return df
+    # Ringkasan dalam satu pass: tanda selisih -1/0/1 -> bincount
+    sign = np.sign(df_comp["diff_abs"].to_numpy()).astype(np.int8) + 1
+    worse, equal, better = np.bincount(sign, minlength=3).tolist()
+
+    df_show = df_comp.loc[:, COMPARE_COLUMNS]
+    return df_show, color_diff(df_show), (better, worse, equal)
 
 
-def color_diff(row):
+def color_diff(df):
     """
-    Styling untuk tabel compare:
+    Styling untuk tabel compare (dipakai dengan `Styler.apply(..., axis=None)`):
     - Hijau kalau score_selected > score_compare
     - Merah kalau score_selected < score_compare
     - Kosong kalau sama
     """
-    diff = row["diff_abs"]
-    if diff > 0:
-        color = "background-color: #c6efce"  # hijau
-    elif diff < 0:
-        color = "background-color: #ffc7ce"  # merah
-    else:
-        color = ""
-    return [
-        color if col in ["score_selected", "score_compare", "diff_abs", "diff_pct"] else ""
-        for col in row.index
-    ]
-
-
-# ------------------------------
-# App Utama
-# ------------------------------
-
-def main():
-    st.set_page_config(
-        page_title="SINTA Analytics – BINUS University",
-        layout="wide",
+    out = pd.DataFrame("", index=df.index, columns=df.columns)
+    diff = df["diff_abs"].to_numpy()
+    css = np.select(
+        [diff > 0, diff < 0],
+        ["background-color: #c6efce", "background-color: #ffc7ce"],  # hijau, merah
+        default="",
     )
+    cols = out.columns.intersection(["score_selected", "score_compare", "diff_abs", "diff_pct"])
+    # Satu kolom CSS yang sama dipakai untuk semua kolom skor/selisih
+    out[cols] = np.repeat(css[:, None], len(cols), axis=1)
+    return out
 
-    st.title("📊 SINTA Analytics App")
-    st.caption(
-        "Memvisualisasikan dan menganalisis data SINTA untuk melihat potensi "
-        "kenaikan peringkat BINUS University (dan afiliasi lain)."
-    )
-
-    # Sidebar: upload file
-    st.sidebar.header("📁 Data Input")
 
-    cluster_file = st.sidebar.file_uploader(
-        "Upload **Sinta Metric Cluster.xlsx**",
-        type=["xlsx"],
-        key="cluster",
-        help="File yang berisi sheet `afiliasi` dan `detail_kode`.",
+def _compare_styler(df_show, css):
+    """
+    Styler tabel compare: format angka + frame CSS yang sudah dihitung di `_compare_cached`.
+    Kolom tetap numerik supaya bisa di-sort dari header tabel.
+    """
+    return (
+        df_show.style
+        .format(
+            {
+                "score_selected": "{:,.2f}",
+                "score_compare": "{:,.2f}",
+                "diff_abs": "{:,.2f}",
+                "diff_pct": "{:,.2f}%",
+            }
+        )
+        .apply(lambda _: css, axis=None)
     )
 
-    metrics_file = st.sidebar.file_uploader(
-        "Upload **Sinta Metrics Detail v2.xlsx / Sinta Metrics Detail.xlsx**",
-        type=["xlsx"],
-        key="metrics",
-        help="File yang berisi sheet `metrics_details` (nilai raw per kode).",
-    )
 
-    st.sidebar.markdown("---")
-    st.sidebar.caption(
-        "Jika tidak upload, app akan mencoba membaca file dengan nama yang sama "
-        "di folder yang sama dengan `app.py`."
-    )
+# ------------------------------
+# Render per Tab
+# ------------------------------
+# Tiap tab dibungkus @st.fragment: interaksi widget di dalam satu tab
+# hanya me-rerun tab tersebut, bukan seluruh script.
 
-    # Load data dengan fallback ke file lokal
-    df_af = df_detail = cat_pivot = df_md = top10_threshold = None
+@st.fragment
+def _render_tab_overview(df_af, aff_row, selected_affiliation):
+    """Tab 1 – Overview & Ranking."""
+    st.subheader("📊 Posisi Umum & Ranking Nasional")
 
-    if cluster_file is not None:
-        df_af, df_detail, cat_pivot, top10_threshold = load_cluster_data(cluster_file)
-    else:
-        try:
-            df_af, df_detail, cat_pivot, top10_threshold = load_cluster_data(
-                "Sinta Metric Cluster.xlsx"
-            )
-            st.sidebar.success("Menggunakan file lokal: Sinta Metric Cluster.xlsx")
-        except Exception:
-            st.error(
-                "Tidak dapat membuka **Sinta Metric Cluster.xlsx**. "
-                "Silakan upload file tersebut di sidebar."
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric(
+            "Peringkat nasional (SINTA Score Overall)",
+            f"{int(aff_row['rank_overall'])}",
+        )
+    with col2:
+        st.metric(
+            "Skor SINTA Overall",
+            f"{int(aff_row['sinta_score_overall']):,}".replace(",", "."),
+        )
+    with col3:
+        st.metric(
+            "Skor SINTA 3 Tahun",
+            f"{int(aff_row['sinta_score_3yr']):,}".replace(",", "."),
+        )
+    with col4:
+        if not pd.isna(aff_row["gap_to_top10"]):
+            gap = int(aff_row["gap_to_top10"])
+            st.metric(
+                "Gap ke batas Top 10",
+                f"{gap:,}".replace(",", "."),
+                help="Selisih skor SINTA overall dibandingkan afiliasi peringkat 10 nasional.",
             )
-            st.stop()
+        else:
+            st.metric("Gap ke batas Top 10", "–")
 
-    if metrics_file is not None:
-        try:
-            df_md = load_metrics_detail(metrics_file)
-        except Exception:
-            df_md = None
-            st.sidebar.warning("Gagal membaca Sinta Metrics Detail (v2) yang diupload.")
-    else:
-        # Coba v2 dulu, lalu fallback ke versi lama
-        try:
-            df_md = load_metrics_detail("Sinta Metrics Detail v2.1.xlsx")
-            st.sidebar.success("Menggunakan file lokal: Sinta Metrics Detail v2.1.xlsx")
-        except Exception:
-            try:
-                df_md = load_metrics_detail("Sinta Metrics Detail.xlsx")
-                st.sidebar.success("Menggunakan file lokal: Sinta Metrics Detail.xlsx")
-            except Exception:
-                df_md = None
-                st.sidebar.info(
-                    "File **Sinta Metrics Detail** tidak ditemukan. "
-                    "Tab analisis metrics detail & compare akan terbatas."
-                )
+    st.markdown("#### Ranking & gap terhadap Top N")
 
-    # Mapping code -> category (untuk tab selain compare)
-    code_cat_map = (
-        df_detail[["kode", "kategori_score"]]
-        .drop_duplicates()
-        .rename(columns={"kode": "code"})
+    max_top_n = min(40, len(df_af))
+    top_n = st.slider(
+        "Tampilkan berapa besar afiliasi teratas?",
+        min_value=5,
+        max_value=max_top_n,
+        value=min(15, max_top_n),
     )
-    code_cat_map["category"] = code_cat_map["kategori_score"].map(CATEGORY_LABELS)
 
-    # Pilih afiliasi (default: Universitas Bina Nusantara kalau ada)
-    affiliations = sorted(df_af["nama_afiliasi"].unique().tolist())
-    default_aff = (
-        affiliations.index("Universitas Bina Nusantara")
-        if "Universitas Bina Nusantara" in affiliations
-        else 0
-    )
+    plot_overall_ranking(df_af, selected_affiliation, top_n=top_n)
 
-    selected_affiliation = st.sidebar.selectbox(
-        "Pilih afiliasi untuk dianalisis (sebagai basis BINUS / A):",
-        options=affiliations,
-        index=default_aff,
-    )
+    st.markdown("#### Tabel Top 20 SINTA Score Overall")
 
-    st.sidebar.markdown("---")
-    st.sidebar.caption(
-        "Tip: Pilih **Universitas Bina Nusantara** untuk fokus analisis ke BINUS University."
+    top20 = df_af.sort_values("sinta_score_overall", ascending=False).head(20)
+    cols_to_show = [
+        "rank_overall",
+        "nama_afiliasi",
+        "sinta_score_overall",
+        "sinta_score_3yr",
+        "gap_to_top10",
+    ]
+    top20 = top20[cols_to_show]
+    st.dataframe(
+        top20.style.format(
+            {
+                "sinta_score_overall": "{:,.0f}",
+                "sinta_score_3yr": "{:,.0f}",
+                "gap_to_top10": "{:,.0f}",
+            }
+        ),
+        height=450,
+        use_container_width=True,
     )
 
-    # Ambil row afiliasi terpilih
-    aff_row = df_af[df_af["nama_afiliasi"] == selected_affiliation].iloc[0]
 
-    # Tabs
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(
-        [
-            "📊 Overview & Ranking",
-            "🏫 Profil Afiliasi",
-            "🎯 High-Leverage Metrics + Simulasi",
-            "📈 Metrics Detail & Raw Values",
-            "⚖️ Compare Universities",
-        ]
-    )
+@st.fragment
+def _render_tab_profile(cat_pivot, per_cat_views, cluster_key, aff_row, selected_affiliation):
+    """Tab 2 – Profil Afiliasi."""
+    st.subheader(f"🏫 Profil Afiliasi: {selected_affiliation}")
 
-    # --------------------------
-    # Tab 1 – Overview & Ranking
-    # --------------------------
-    with tab1:
-        st.subheader("📊 Posisi Umum & Ranking Nasional")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(
+            "Peringkat nasional",
+            f"{int(aff_row['rank_overall'])}",
+        )
+    with col2:
+        st.metric(
+            "Skor SINTA Overall",
+            f"{int(aff_row['sinta_score_overall']):,}".replace(",", "."),
+        )
+    with col3:
+        st.metric(
+            "Skor SINTA 3 Tahun",
+            f"{int(aff_row['sinta_score_3yr']):,}".replace(",", "."),
+        )
 
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric(
-                "Peringkat nasional (SINTA Score Overall)",
-                f"{int(aff_row['rank_overall'])}",
-            )
-        with col2:
-            st.metric(
-                "Skor SINTA Overall",
-                f"{int(aff_row['sinta_score_overall']):,}".replace(",", "."),
-            )
-        with col3:
-            st.metric(
-                "Skor SINTA 3 Tahun",
-                f"{int(aff_row['sinta_score_3yr']):,}".replace(",", "."),
-            )
-        with col4:
-            if not pd.isna(aff_row["gap_to_top10"]):
-                gap = int(aff_row["gap_to_top10"])
-                st.metric(
-                    "Gap ke batas Top 10",
-                    f"{gap:,}".replace(",", "."),
-                    help="Selisih skor SINTA overall dibandingkan afiliasi peringkat 10 nasional.",
-                )
-            else:
-                st.metric("Gap ke batas Top 10", "–")
+    st.markdown("#### Kontribusi per Kategori Skor SINTA")
+    plot_category_breakdown(cat_pivot, cluster_key, selected_affiliation)
 
-        st.markdown("#### Ranking & gap terhadap Top N")
+    st.markdown("#### Perbandingan kategori dengan afiliasi lain")
 
-        max_top_n = min(40, len(df_af))
-        top_n = st.slider(
-            "Tampilkan berapa besar afiliasi teratas?",
-            min_value=5,
-            max_value=max_top_n,
-            value=min(15, max_top_n),
+    cat_to_compare = st.selectbox(
+        "Pilih kategori untuk dibandingkan:",
+        options=CATEGORY_ORDER,
+    )
+
+    df_view = per_cat_views.get(cat_to_compare)
+    if df_view is not None:
+        chart = (
+            alt.Chart(df_view)
+            .mark_bar()
+            .encode(
+                x=alt.X("total:Q", title=f"Total Skor – {cat_to_compare}"),
+                y=alt.Y("nama_afiliasi:N", sort="-x", title="Afiliasi"),
+                opacity=alt.condition(
+                    alt.datum.nama_afiliasi == selected_affiliation,
+                    alt.value(1.0),
+                    alt.value(0.4),
+                ),
+                tooltip=[
+                    alt.Tooltip("nama_afiliasi:N", title="Afiliasi"),
+                    alt.Tooltip("total:Q", title="Total Skor", format=","),
+                    alt.Tooltip(
+                        "rank_in_category:Q", title="Peringkat di kategori"
+                    ),
+                ],
+            )
+            .properties(height=500)
         )
+        st.altair_chart(chart, use_container_width=True)
+    else:
+        st.info("Kategori tersebut tidak ditemukan di data kategori.")
 
-        plot_overall_ranking(df_af, selected_affiliation, top_n=top_n)
 
-        st.markdown("#### Tabel Top 20 SINTA Score Overall")
+@st.fragment
+def _render_tab_high_leverage(df_detail, cat_pivot, cluster_key, selected_affiliation):
+    """Tab 3 – High-Leverage Metrics + Simulasi."""
+    st.subheader(f"🎯 High-Leverage Metrics – {selected_affiliation}")
 
-        top20 = (
-            df_af.sort_values("sinta_score_overall", ascending=False)
-            .head(20)
-            .copy()
-        )
-        cols_to_show = [
-            "rank_overall",
-            "nama_afiliasi",
-            "sinta_score_overall",
-            "sinta_score_3yr",
-            "gap_to_top10",
+    df_high = get_high_leverage_metrics(
+        df_detail, cluster_key, selected_affiliation, top_k=30
+    )
+
+    st.markdown(
+        "Indikator di bawah ini adalah kombinasi **bobot tinggi** dan **value masih rendah**. "
+        "Kalau nilai indikator ini bisa dinaikkan, potensi kenaikan skor kategori "
+        "dan skor SINTA cukup besar."
+    )
+
+    plot_high_leverage_bar(df_high)
+
+    st.markdown("#### Detail High-Leverage Metrics (Top 30)")
+    if not df_high.empty:
+        show_cols = [
+            "kode",
+            "nama",
+            "category",
+            "weight",
+            "value",
+            "total",
+            "potential_gain",
         ]
-        top20 = top20[cols_to_show]
         st.dataframe(
-            top20.style.format(
+            df_high[show_cols].style.format(
                 {
-                    "sinta_score_overall": "{:,.0f}",
-                    "sinta_score_3yr": "{:,.0f}",
-                    "gap_to_top10": "{:,.0f}",
+                    "weight": "{:,.2f}",
+                    "value": "{:,.3f}",
+                    "total": "{:,.3f}",
+                    "potential_gain": "{:,.3f}",
                 }
             ),
-            height=450,
             use_container_width=True,
+            height=500,
         )
+    else:
+        st.info("Tidak ada data high-leverage untuk afiliasi ini.")
 
-    # --------------------------
-    # Tab 2 – Profil Afiliasi
-    # --------------------------
-    with tab2:
-        st.subheader(f"🏫 Profil Afiliasi: {selected_affiliation}")
+    st.markdown("---")
+    st.subheader("🧪 Simulasi Sederhana: Naikkan Nilai Indikator")
 
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric(
-                "Peringkat nasional",
-                f"{int(aff_row['rank_overall'])}",
-            )
-        with col2:
-            st.metric(
-                "Skor SINTA Overall",
-                f"{int(aff_row['sinta_score_overall']):,}".replace(",", "."),
-            )
-        with col3:
-            st.metric(
-                "Skor SINTA 3 Tahun",
-                f"{int(aff_row['sinta_score_3yr']):,}".replace(",", "."),
-            )
+    st.caption(
+        "Simulasi ini **tidak** menghitung ulang skor SINTA resmi, "
+        "tapi memberi gambaran bagaimana perubahan value indikator "
+        "mempengaruhi total skor per kategori."
+    )
 
-        st.markdown("#### Kontribusi per Kategori Skor SINTA")
-        plot_category_breakdown(cat_pivot, selected_affiliation)
+    if selected_affiliation not in cat_pivot.index:
+        st.info("Tidak bisa melakukan simulasi karena data kategori tidak lengkap.")
+    else:
+        sim_categories = st.multiselect(
+            "Pilih kategori yang ingin ditingkatkan:",
+            options=CATEGORY_ORDER,
+            default=["Publication", "HKI"],
+        )
 
-        st.markdown("#### Perbandingan kategori dengan afiliasi lain")
+        delta_value = st.slider(
+            "Naikkan value semua indikator di kategori tersebut sebesar:",
+            min_value=0.0,
+            max_value=0.5,
+            value=0.1,
+            step=0.05,
+            help="Misalnya 0.1 berarti value naik 0.1 (maksimum 1.0).",
+        )
 
-        cat_to_compare = st.selectbox(
-            "Pilih kategori untuk dibandingkan:",
-            options=CATEGORY_ORDER,
+        if st.button("Hitung Simulasi", type="primary"):
+            if not sim_categories:
+                st.warning("Pilih minimal satu kategori untuk simulasi.")
+            else:
+                df_cat_sim = _simulate_category_totals(
+                    df_detail,
+                    cluster_key,
+                    selected_affiliation,
+                    tuple(sim_categories),
+                    delta_value,
+                )
+
+                st.markdown("##### Hasil Simulasi per Kategori")
+                st.dataframe(
+                    df_cat_sim.style.format(
+                        {
+                            "original_total": "{:,.3f}",
+                            "simulated_total": "{:,.3f}",
+                            "change": "{:,.3f}",
+                            "change_percent": "{:,.2f}%",
+                        }
+                    ),
+                    use_container_width=True,
+                    height=350,
+                )
+
+                st.caption(
+                    "Interpretasi sederhana: semakin besar `change` dan `change_percent` "
+                    "di kategori tertentu, semakin besar potensi kontribusi dari peningkatan "
+                    "indikator-indikator di kategori tersebut."
+                )
+
+
+@st.fragment
+def _render_tab_metrics_detail(df_md, code_cat_map, md_keys, selected_affiliation):
+    """Tab 4 – Metrics Detail & Raw Values."""
+    st.subheader("📈 Analisis dari Sinta Metrics Detail")
+
+    if df_md is None:
+        st.info(
+            "Data **Sinta Metrics Detail** belum tersedia. "
+            "Upload file Sinta Metrics Detail v2.xlsx / Sinta Metrics Detail.xlsx di sidebar."
         )
+    else:
+        aff_upper = md_keys[selected_affiliation]
+        df_md_aff = _rows_for(df_md, aff_upper)
 
-        if cat_to_compare in cat_pivot.columns:
-            df_compare = (
-                cat_pivot[[cat_to_compare]]
-                .reset_index()
-                .rename(columns={cat_to_compare: "total"})
+        if df_md_aff.empty:
+            st.warning(
+                "Tidak ditemukan baris di Sinta Metrics Detail untuk afiliasi ini. "
+                "Pastikan penulisan nama afiliasi di file sama dengan yang di SINTA Metric Cluster."
             )
-            df_compare["rank_in_category"] = (
-                df_compare["total"].rank(ascending=False, method="min").astype(int)
+        else:
+            # Join kategori (versi cluster) hanya untuk analisis tambahan
+            df_md_aff = df_md_aff.join(code_cat_map["category"], on="code")
+
+            st.caption(
+                f"Analisis berikut menggunakan **Sinta Metrics Detail** untuk afiliasi: `{aff_upper}`."
             )
 
-            df_compare = df_compare.sort_values("total", ascending=False)
-            top_k_cat = min(20, len(df_compare))
-            df_view = df_compare.head(top_k_cat)
-
-            chart = (
-                alt.Chart(df_view)
-                .mark_bar()
-                .encode(
-                    x=alt.X("total:Q", title=f"Total Skor – {cat_to_compare}"),
-                    y=alt.Y("nama_afiliasi:N", sort="-x", title="Afiliasi"),
-                    opacity=alt.condition(
-                        alt.datum.nama_afiliasi == selected_affiliation,
-                        alt.value(1.0),
-                        alt.value(0.4),
-                    ),
-                    tooltip=[
-                        alt.Tooltip("nama_afiliasi:N", title="Afiliasi"),
-                        alt.Tooltip("total:Q", title="Total Skor", format=","),
-                        alt.Tooltip(
-                            "rank_in_category:Q", title="Peringkat di kategori"
-                        ),
-                    ],
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                total_overall = df_md_aff["sinta_v3_overall_total"].sum()
+                st.metric("Total skor overall (sum semua kode)", f"{total_overall:,.0f}")
+            with col2:
+                total_3yr = df_md_aff["sinta_v3_3yr_total"].sum()
+                st.metric("Total skor 3-year (sum semua kode)", f"{total_3yr:,.0f}")
+            with col3:
+                recent_ratio = (
+                    total_3yr / total_overall * 100 if total_overall > 0 else np.nan
+                )
+                st.metric(
+                    "Proporsi skor 3 tahun terakhir",
+                    f"{recent_ratio:,.1f}%" if not np.isnan(recent_ratio) else "–",
                 )
-                .properties(height=500)
+
+            st.markdown("#### Top 15 Indikator Penyumbang Skor Terbesar (Overall Total)")
+
+            df_md_aff["overall_share"] = df_md_aff["sinta_v3_overall_total"] / max(
+                df_md_aff["sinta_v3_overall_total"].sum(), 1
             )
-            st.altair_chart(chart, use_container_width=True)
-        else:
-            st.info("Kategori tersebut tidak ditemukan di data kategori.")
 
-    # --------------------------
-    # Tab 3 – High-Leverage Metrics + Simulasi
-    # --------------------------
-    with tab3:
-        st.subheader(f"🎯 High-Leverage Metrics – {selected_affiliation}")
+            top_overall = (
+                df_md_aff.sort_values("sinta_v3_overall_total", ascending=False)
+                .head(15)
+            )
+
+            st.dataframe(
+                top_overall[
+                    [
+                        "code",
+                        "name",
+                        "area",
+                        "category",
+                        "weight",
+                        "sinta_v3_overall_value",
+                        "sinta_v3_overall_total",
+                        "overall_share",
+                    ]
+                ].style.format(
+                    {
+                        "weight": "{:,.2f}",
+                        "sinta_v3_overall_value": "{:,.0f}",
+                        "sinta_v3_overall_total": "{:,.0f}",
+                        "overall_share": "{:.2%}",
+                    }
+                ),
+                use_container_width=True,
+                height=350,
+            )
 
-        df_high = get_high_leverage_metrics(df_detail, selected_affiliation, top_k=30)
+            st.markdown("#### Indikator yang Paling 'Baru' (Fokus 3 Tahun Terakhir)")
 
-        st.markdown(
-            "Indikator di bawah ini adalah kombinasi **bobot tinggi** dan **value masih rendah**. "
-            "Kalau nilai indikator ini bisa dinaikkan, potensi kenaikan skor kategori "
-            "dan skor SINTA cukup besar."
-        )
+            df_md_aff["recent_ratio"] = np.where(
+                df_md_aff["sinta_v3_overall_total"] > 0,
+                df_md_aff["sinta_v3_3yr_total"] / df_md_aff["sinta_v3_overall_total"],
+                np.nan,
+            )
 
-        plot_high_leverage_bar(df_high)
+            recent_top = (
+                df_md_aff[df_md_aff["sinta_v3_3yr_total"] > 0]
+                .sort_values("recent_ratio", ascending=False)
+                .head(15)
+            )
+
+            st.dataframe(
+                recent_top[
+                    [
+                        "code",
+                        "name",
+                        "area",
+                        "category",
+                        "weight",
+                        "sinta_v3_overall_total",
+                        "sinta_v3_3yr_total",
+                        "recent_ratio",
+                    ]
+                ].style.format(
+                    {
+                        "weight": "{:,.2f}",
+                        "sinta_v3_overall_total": "{:,.0f}",
+                        "sinta_v3_3yr_total": "{:,.0f}",
+                        "recent_ratio": "{:.2%}",
+                    }
+                ),
+                use_container_width=True,
+                height=350,
+            )
 
-        st.markdown("#### Detail High-Leverage Metrics (Top 30)")
-        if not df_high.empty:
-            show_cols = [
-                "kode",
-                "nama",
+            st.markdown("---")
+            st.markdown("#### Tabel Nilai Raw per Kode (Filterable)")
+
+            filter_text = st.text_input(
+                "Filter berdasarkan kode atau nama indikator (opsional):",
+                value="",
+                key="md_filter_text",
+            ).strip()
+
+            df_view = df_md_aff
+            if filter_text:
+                # Satu pass substring biasa (bukan regex) di kolom `_search`
+                mask = df_view["_search"].str.contains(filter_text.lower(), regex=False)
+                df_view = df_view[mask]
+
+            cols_show = [
+                "code",
+                "name",
+                "area",
                 "category",
                 "weight",
-                "value",
-                "total",
-                "potential_gain",
+                "sinta_v3_overall_value",
+                "sinta_v3_overall_total",
+                "sinta_v3_3yr_value",
+                "sinta_v3_3yr_total",
             ]
+            cols_show = [c for c in cols_show if c in df_view.columns]
+
             st.dataframe(
-                df_high[show_cols].style.format(
+                df_view[cols_show].style.format(
                     {
                         "weight": "{:,.2f}",
-                        "value": "{:,.3f}",
-                        "total": "{:,.3f}",
-                        "potential_gain": "{:,.3f}",
+                        "sinta_v3_overall_value": "{:,.0f}",
+                        "sinta_v3_overall_total": "{:,.0f}",
+                        "sinta_v3_3yr_value": "{:,.0f}",
+                        "sinta_v3_3yr_total": "{:,.0f}",
                     }
                 ),
                 use_container_width=True,
-                height=500,
+                height=450,
             )
-        else:
-            st.info("Tidak ada data high-leverage untuk afiliasi ini.")
 
-        st.markdown("---")
-        st.subheader("🧪 Simulasi Sederhana: Naikkan Nilai Indikator")
 
-        st.caption(
-            "Simulasi ini **tidak** menghitung ulang skor SINTA resmi, "
-            "tapi memberi gambaran bagaimana perubahan value indikator "
-            "mempengaruhi total skor per kategori."
-        )
+@st.fragment
+def _render_tab_compare(df_md, md_key, affiliations, default_aff, md_keys):
+    """Tab 5 – Compare Universities."""
+    st.subheader("⚖️ Bandingkan Dua Universitas per Metric")
 
-        if selected_affiliation not in cat_pivot.index:
-            st.info("Tidak bisa melakukan simulasi karena data kategori tidak lengkap.")
-        else:
-            # Data detail untuk afiliasi terpilih
-            df_aff_detail = df_detail[df_detail["nama_afiliasi"] == selected_affiliation].copy()
-            df_aff_detail["category"] = df_aff_detail["kategori_score"].map(CATEGORY_LABELS)
-
-            sim_categories = st.multiselect(
-                "Pilih kategori yang ingin ditingkatkan:",
-                options=CATEGORY_ORDER,
-                default=["Publication", "HKI"],
+    if df_md is None:
+        st.info(
+            "Data **Sinta Metrics Detail** belum tersedia, jadi fitur compare belum bisa digunakan. "
+            "Upload Sinta Metrics Detail v2.xlsx / Sinta Metrics Detail.xlsx di sidebar dulu."
+        )
+    else:
+        col_a, col_b = st.columns(2)
+        with col_a:
+            aff_a = st.selectbox(
+                "Universitas A (acuan / hijau):",
+                options=affiliations,
+                index=default_aff,
             )
-
-            delta_value = st.slider(
-                "Naikkan value semua indikator di kategori tersebut sebesar:",
-                min_value=0.0,
-                max_value=0.5,
-                value=0.1,
-                step=0.05,
-                help="Misalnya 0.1 berarti value naik 0.1 (maksimum 1.0).",
+        with col_b:
+            # default B: kampus tepat di atas BINUS kalau ada, kalau tidak index 0
+            default_b_idx = 0
+            if "Universitas Bina Nusantara" in affiliations:
+                idx_binus = affiliations.index("Universitas Bina Nusantara")
+                default_b_idx = max(0, idx_binus - 1)
+            aff_b = st.selectbox(
+                "Universitas B (pembanding / baseline):",
+                options=affiliations,
+                index=default_b_idx,
             )
 
-            if st.button("Hitung Simulasi", type="primary"):
-                if not sim_categories:
-                    st.warning("Pilih minimal satu kategori untuk simulasi.")
-                else:
-                    df_sim = df_aff_detail.copy()
-                    mask = df_sim["category"].isin(sim_categories)
-
-                    df_sim["value_sim"] = df_sim["value"]
-                    df_sim.loc[mask, "value_sim"] = (
-                        df_sim.loc[mask, "value_sim"] + delta_value
-                    ).clip(upper=1.0)
-
-                    df_sim["total_sim"] = df_sim["weight"] * df_sim["value_sim"]
-
-                    # Agregasi kategori: sebelum dan sesudah
-                    original_cat = (
-                        df_aff_detail.groupby("category")["total"].sum().rename("original_total")
-                    )
-                    sim_cat = (
-                        df_sim.groupby("category")["total_sim"].sum().rename("simulated_total")
-                    )
-
-                    df_cat_sim = (
-                        pd.concat([original_cat, sim_cat], axis=1)
-                        .fillna(0)
-                        .reset_index()
-                    )
-                    df_cat_sim["change"] = df_cat_sim["simulated_total"] - df_cat_sim["original_total"]
-                    df_cat_sim["change_percent"] = np.where(
-                        df_cat_sim["original_total"] > 0,
-                        df_cat_sim["change"] / df_cat_sim["original_total"] * 100,
-                        np.nan,
-                    )
-
-                    df_cat_sim["category"] = pd.Categorical(
-                        df_cat_sim["category"],
-                        categories=CATEGORY_ORDER,
-                        ordered=True,
-                    )
-                    df_cat_sim = df_cat_sim.sort_values("category")
-
-                    st.markdown("##### Hasil Simulasi per Kategori")
-                    st.dataframe(
-                        df_cat_sim.style.format(
-                            {
-                                "original_total": "{:,.3f}",
-                                "simulated_total": "{:,.3f}",
-                                "change": "{:,.3f}",
-                                "change_percent": "{:,.2f}%",
-                            }
-                        ),
-                        use_container_width=True,
-                        height=350,
-                    )
-
-                    st.caption(
-                        "Interpretasi sederhana: semakin besar `change` dan `change_percent` "
-                        "di kategori tertentu, semakin besar potensi kontribusi dari peningkatan "
-                        "indikator-indikator di kategori tersebut."
-                    )
-
-    # --------------------------
-    # Tab 4 – Metrics Detail & Raw Values
-    # --------------------------
-    with tab4:
-        st.subheader("📈 Analisis dari Sinta Metrics Detail")
+        metric_type = st.selectbox(
+            "Pilih jenis skor untuk dibandingkan:",
+            options=[
+                "Overall Total (sinta_v3_overall_total)",
+                "3-Year Total (sinta_v3_3yr_total)",
+                "Overall Value (sinta_v3_overall_value)",
+            ],
+        )
 
-        if df_md is None:
-            st.info(
-                "Data **Sinta Metrics Detail** belum tersedia. "
-                "Upload file Sinta Metrics Detail v2.xlsx / Sinta Metrics Detail.xlsx di sidebar."
+        metric_col_map = {
+            "Overall Total (sinta_v3_overall_total)": "sinta_v3_overall_total",
+            "3-Year Total (sinta_v3_3yr_total)": "sinta_v3_3yr_total",
+            "Overall Value (sinta_v3_overall_value)": "sinta_v3_overall_value",
+        }
+        metric_col = metric_col_map[metric_type]
+
+        # Kategori filter diambil dari kolom `area` pada Sinta Metrics Detail v2
+        # (categorical sejak load: categories sudah unik & urut, tanpa NaN)
+        area_options = df_md["area"].cat.categories.tolist()
+        cat_filter = st.multiselect(
+            "Filter kategori / area (opsional):",
+            options=area_options,
+            default=[],
+            help="Kategori diambil dari kolom `area` (Publikasi, Penelitian, Pengabdian Kepada Masyarakat, dll).",
+        )
+
+        show_n = st.slider(
+            "Tampilkan berapa metric dengan selisih absolut terbesar?",
+            min_value=10,
+            max_value=100,
+            value=100,
+            step=5,
+        )
+
+        # Hasil terakhir disimpan di session_state: rerun karena widget lain (tanpa
+        # menekan tombol) menampilkan ulang hasil itu selama pilihannya masih sama
+        run_params = (
+            md_key,
+            aff_a,
+            aff_b,
+            metric_col,
+            tuple(cat_filter),
+            show_n,
+        )
+        if st.button("Bandingkan", type="primary"):
+            st.session_state["tab5_result"] = _compare_cached(
+                df_md,
+                md_key,
+                md_keys[aff_a],
+                md_keys[aff_b],
+                metric_col,
+                tuple(cat_filter),
+                show_n,
+            )
+            st.session_state["tab5_last_run"] = run_params
+
+        if st.session_state.get("tab5_last_run") == run_params:
+            df_show, css, (better, worse, equal) = st.session_state["tab5_result"]
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric(f"Metric di mana {aff_a} lebih tinggi", better)
+            with col2:
+                st.metric(f"Metric di mana {aff_a} lebih rendah", worse)
+            with col3:
+                st.metric("Metric sama / imbang", equal)
+
+            st.markdown(
+                f"#### Perbandingan per Metric ({metric_type})\n"
+                f"**Hijau**: skor {aff_a} lebih tinggi, **Merah**: skor {aff_a} lebih rendah."
             )
-        else:
-            aff_upper = selected_affiliation.upper()
-            df_md_aff = df_md[df_md["affiliation_name"] == aff_upper].copy()
 
-            if df_md_aff.empty:
-                st.warning(
-                    "Tidak ditemukan baris di Sinta Metrics Detail untuk afiliasi ini. "
-                    "Pastikan penulisan nama afiliasi di file sama dengan yang di SINTA Metric Cluster."
-                )
-            else:
-                # Join kategori (versi cluster) hanya untuk analisis tambahan
-                df_md_aff = df_md_aff.merge(
-                    code_cat_map[["code", "category"]],
-                    on="code",
-                    how="left",
-                )
+            st.caption(f"score_selected = {aff_a}  |  score_compare = {aff_b}")
 
-                st.caption(
-                    f"Analisis berikut menggunakan **Sinta Metrics Detail** untuk afiliasi: `{aff_upper}`."
-                )
+            st.dataframe(_compare_styler(df_show, css), use_container_width=True, height=600)
 
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    total_overall = df_md_aff["sinta_v3_overall_total"].sum()
-                    st.metric("Total skor overall (sum semua kode)", f"{total_overall:,.0f}")
-                with col2:
-                    total_3yr = df_md_aff["sinta_v3_3yr_total"].sum()
-                    st.metric("Total skor 3-year (sum semua kode)", f"{total_3yr:,.0f}")
-                with col3:
-                    recent_ratio = (
-                        total_3yr / total_overall * 100 if total_overall > 0 else np.nan
-                    )
-                    st.metric(
-                        "Proporsi skor 3 tahun terakhir",
-                        f"{recent_ratio:,.1f}%" if not np.isnan(recent_ratio) else "–",
-                    )
-
-                st.markdown("#### Top 15 Indikator Penyumbang Skor Terbesar (Overall Total)")
-
-                df_md_aff["overall_share"] = df_md_aff["sinta_v3_overall_total"] / max(
-                    df_md_aff["sinta_v3_overall_total"].sum(), 1
-                )
 
-                top_overall = (
-                    df_md_aff.sort_values("sinta_v3_overall_total", ascending=False)
-                    .head(15)
-                    .copy()
-                )
+# ------------------------------
+# App Utama
+# ------------------------------
 
-                st.dataframe(
-                    top_overall[
-                        [
-                            "code",
-                            "name",
-                            "area",
-                            "category",
-                            "weight",
-                            "sinta_v3_overall_value",
-                            "sinta_v3_overall_total",
-                            "overall_share",
-                        ]
-                    ].style.format(
-                        {
-                            "weight": "{:,.2f}",
-                            "sinta_v3_overall_value": "{:,.0f}",
-                            "sinta_v3_overall_total": "{:,.0f}",
-                            "overall_share": "{:.2%}",
-                        }
-                    ),
-                    use_container_width=True,
-                    height=350,
-                )
+def _safe_load_cluster(cluster_file):
+    """
+    Load data cluster dari file upload, atau dari file lokal kalau tidak ada upload.
+    Return (hasil load_cluster_data atau None kalau file lokal gagal dibuka, nama file lokal).
+    """
+    if cluster_file is not None:
+        return load_cluster_data(cluster_file), None
+    try:
+        data = load_cluster_data(LOCAL_CLUSTER_FILE, _source_key(LOCAL_CLUSTER_FILE))
+        return data, LOCAL_CLUSTER_FILE
+    except Exception:
+        return None, None
 
-                st.markdown("#### Indikator yang Paling 'Baru' (Fokus 3 Tahun Terakhir)")
 
-                df_md_aff["recent_ratio"] = np.where(
-                    df_md_aff["sinta_v3_overall_total"] > 0,
-                    df_md_aff["sinta_v3_3yr_total"] / df_md_aff["sinta_v3_overall_total"],
-                    np.nan,
-                )
+def _safe_load_metrics(metrics_file):
+    """
+    Load Sinta Metrics Detail dari file upload, atau file lokal (v2.1 dulu, lalu versi lama).
+    Return (df_md atau None, source_key atau None, nama file lokal yang dipakai atau None).
+    """
+    if metrics_file is not None:
+        try:
+            return *load_metrics_detail(metrics_file), None
+        except Exception:
+            return None, None, None
+    for name in LOCAL_METRICS_FILES:
+        try:
+            return *load_metrics_detail(name, _source_key(name)), name
+        except Exception:
+            continue
+    return None, None, None
 
-                recent_top = (
-                    df_md_aff[df_md_aff["sinta_v3_3yr_total"] > 0]
-                    .sort_values("recent_ratio", ascending=False)
-                    .head(15)
-                    .copy()
-                )
 
-                st.dataframe(
-                    recent_top[
-                        [
-                            "code",
-                            "name",
-                            "area",
-                            "category",
-                            "weight",
-                            "sinta_v3_overall_total",
-                            "sinta_v3_3yr_total",
-                            "recent_ratio",
-                        ]
-                    ].style.format(
-                        {
-                            "weight": "{:,.2f}",
-                            "sinta_v3_overall_total": "{:,.0f}",
-                            "sinta_v3_3yr_total": "{:,.0f}",
-                            "recent_ratio": "{:.2%}",
-                        }
-                    ),
-                    use_container_width=True,
-                    height=350,
-                )
+def main():
+    st.set_page_config(
+        page_title="SINTA Analytics – BINUS University",
+        layout="wide",
+    )
 
-                st.markdown("---")
-                st.markdown("#### Tabel Nilai Raw per Kode (Filterable)")
-
-                filter_text = st.text_input(
-                    "Filter berdasarkan kode atau nama indikator (opsional):",
-                    value="",
-                ).strip()
-
-                df_view = df_md_aff.copy()
-                if filter_text:
-                    mask = (
-                        df_view["code"].astype(str).str.contains(filter_text, case=False)
-                        | df_view["name"].astype(str).str.contains(filter_text, case=False)
-                    )
-                    df_view = df_view[mask]
-
-                cols_show = [
-                    "code",
-                    "name",
-                    "area",
-                    "category",
-                    "weight",
-                    "sinta_v3_overall_value",
-                    "sinta_v3_overall_total",
-                    "sinta_v3_3yr_value",
-                    "sinta_v3_3yr_total",
-                ]
-                cols_show = [c for c in cols_show if c in df_view.columns]
+    st.title("📊 SINTA Analytics App")
+    st.caption(
+        "Memvisualisasikan dan menganalisis data SINTA untuk melihat potensi "
+        "kenaikan peringkat BINUS University (dan afiliasi lain)."
+    )
 
-                st.dataframe(
-                    df_view[cols_show].style.format(
-                        {
-                            "weight": "{:,.2f}",
-                            "sinta_v3_overall_value": "{:,.0f}",
-                            "sinta_v3_overall_total": "{:,.0f}",
-                            "sinta_v3_3yr_value": "{:,.0f}",
-                            "sinta_v3_3yr_total": "{:,.0f}",
-                        }
-                    ),
-                    use_container_width=True,
-                    height=450,
-                )
+    # Sidebar: upload file
+    st.sidebar.header("📁 Data Input")
 
-    # --------------------------
-    # Tab 5 – Compare Universities
-    # --------------------------
-    with tab5:
-        st.subheader("⚖️ Bandingkan Dua Universitas per Metric")
+    cluster_file = st.sidebar.file_uploader(
+        "Upload **Sinta Metric Cluster.xlsx**",
+        type=["xlsx"],
+        key="cluster",
+        help="File yang berisi sheet `afiliasi` dan `detail_kode`.",
+    )
 
-        if df_md is None:
-            st.info(
-                "Data **Sinta Metrics Detail** belum tersedia, jadi fitur compare belum bisa digunakan. "
-                "Upload Sinta Metrics Detail v2.xlsx / Sinta Metrics Detail.xlsx di sidebar dulu."
-            )
-        else:
-            col_a, col_b = st.columns(2)
-            with col_a:
-                aff_a = st.selectbox(
-                    "Universitas A (acuan / hijau):",
-                    options=affiliations,
-                    index=default_aff,
-                )
-            with col_b:
-                # default B: kampus tepat di atas BINUS kalau ada, kalau tidak index 0
-                default_b_idx = 0
-                if "Universitas Bina Nusantara" in affiliations:
-                    idx_binus = affiliations.index("Universitas Bina Nusantara")
-                    default_b_idx = max(0, idx_binus - 1)
-                aff_b = st.selectbox(
-                    "Universitas B (pembanding / baseline):",
-                    options=affiliations,
-                    index=default_b_idx,
-                )
+    metrics_file = st.sidebar.file_uploader(
+        "Upload **Sinta Metrics Detail v2.xlsx / Sinta Metrics Detail.xlsx**",
+        type=["xlsx"],
+        key="metrics",
+        help="File yang berisi sheet `metrics_details` (nilai raw per kode).",
+    )
 
-            metric_type = st.selectbox(
-                "Pilih jenis skor untuk dibandingkan:",
-                options=[
-                    "Overall Total (sinta_v3_overall_total)",
-                    "3-Year Total (sinta_v3_3yr_total)",
-                    "Overall Value (sinta_v3_overall_value)",
-                ],
-            )
+    st.sidebar.markdown("---")
+    st.sidebar.caption(
+        "Jika tidak upload, app akan mencoba membaca file dengan nama yang sama "
+        "di folder yang sama dengan `app.py`."
+    )
 
-            metric_col_map = {
-                "Overall Total (sinta_v3_overall_total)": "sinta_v3_overall_total",
-                "3-Year Total (sinta_v3_3yr_total)": "sinta_v3_3yr_total",
-                "Overall Value (sinta_v3_overall_value)": "sinta_v3_overall_value",
-            }
-            metric_col = metric_col_map[metric_type]
-
-            # Kategori filter diambil dari kolom `area` pada Sinta Metrics Detail v2
-            area_options = sorted(df_md["area"].dropna().unique().tolist())
-            cat_filter = st.multiselect(
-                "Filter kategori / area (opsional):",
-                options=area_options,
-                default=[],
-                help="Kategori diambil dari kolom `area` (Publikasi, Penelitian, Pengabdian Kepada Masyarakat, dll).",
-            )
+    # Load data dengan fallback ke file lokal; kedua file dibaca paralel (saat cache miss)
+    ctx = get_script_run_ctx()
+    with st.spinner("Memuat data SINTA…"):
+        with ThreadPoolExecutor(
+            max_workers=2, initializer=add_script_run_ctx, initargs=(None, ctx)
+        ) as ex:
+            fut_cluster = ex.submit(_safe_load_cluster, cluster_file)
+            fut_metrics = ex.submit(_safe_load_metrics, metrics_file)
+            cluster_data, cluster_local = fut_cluster.result()
+            df_md, md_key, metrics_local = fut_metrics.result()
+
+    if cluster_data is None:
+        st.error(
+            "Tidak dapat membuka **Sinta Metric Cluster.xlsx**. "
+            "Silakan upload file tersebut di sidebar."
+        )
+        st.stop()
+    (
+        df_af, df_detail, cat_pivot, per_cat_views, top10_threshold, code_cat_map, cluster_key
+    ) = cluster_data
+    if cluster_local is not None:
+        st.sidebar.success(f"Menggunakan file lokal: {cluster_local}")
 
-            show_n = st.slider(
-                "Tampilkan berapa metric dengan selisih absolut terbesar?",
-                min_value=10,
-                max_value=100,
-                value=100,
-                step=5,
-            )
+    if metrics_file is not None:
+        if df_md is None:
+            st.sidebar.warning("Gagal membaca Sinta Metrics Detail (v2) yang diupload.")
+    elif metrics_local is not None:
+        st.sidebar.success(f"Menggunakan file lokal: {metrics_local}")
+    else:
+        st.sidebar.info(
+            "File **Sinta Metrics Detail** tidak ditemukan. "
+            "Tab analisis metrics detail & compare akan terbatas."
+        )
 
-            if st.button("Bandingkan", type="primary"):
-                aff_a_upper = aff_a.upper()
-                aff_b_upper = aff_b.upper()
+    # Pilih afiliasi (default: Universitas Bina Nusantara kalau ada)
+    affiliations, default_aff, md_keys = _affiliation_options(df_af, cluster_key)
 
-                df_comp = compare_universities_df(
-                    df_md, aff_a_upper, aff_b_upper, metric_col
-                )
+    selected_affiliation = st.sidebar.selectbox(
+        "Pilih afiliasi untuk dianalisis (sebagai basis BINUS / A):",
+        options=affiliations,
+        index=default_aff,
+    )
 
-                # Filter kategori jika dipilih
-                if cat_filter:
-                    df_comp = df_comp[df_comp["category"].isin(cat_filter)]
+    st.sidebar.markdown("---")
+    st.sidebar.caption(
+        "Tip: Pilih **Universitas Bina Nusantara** untuk fokus analisis ke BINUS University."
+    )
 
-                # Sort berdasarkan selisih absolut terbesar
-                df_comp = df_comp.sort_values(
-                    "diff_abs", key=lambda s: s.abs(), ascending=False
-                )
+    # Ambil row afiliasi terpilih
+    aff_row = df_af[df_af["nama_afiliasi"] == selected_affiliation].iloc[0]
 
-                # Ambil top N
-                df_comp = df_comp.head(show_n)
-
-                # Ringkasan
-                better = (df_comp["diff_abs"] > 0).sum()
-                worse = (df_comp["diff_abs"] < 0).sum()
-                equal = (df_comp["diff_abs"] == 0).sum()
-
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric(f"Metric di mana {aff_a} lebih tinggi", better)
-                with col2:
-                    st.metric(f"Metric di mana {aff_a} lebih rendah", worse)
-                with col3:
-                    st.metric("Metric sama / imbang", equal)
-
-                st.markdown(
-                    f"#### Perbandingan per Metric ({metric_type})\n"
-                    f"**Hijau**: skor {aff_a} lebih tinggi, **Merah**: skor {aff_a} lebih rendah."
-                )
+    # Tabs
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+        [
+            "📊 Overview & Ranking",
+            "🏫 Profil Afiliasi",
+            "🎯 High-Leverage Metrics + Simulasi",
+            "📈 Metrics Detail & Raw Values",
+            "⚖️ Compare Universities",
+        ]
+    )
 
-                # Siapkan dataframe yang akan ditampilkan
-                df_show = df_comp[
-                    [
-                        "code",
-                        "name",
-                        "category",   # ini = area, misalnya Publikasi / Penelitian / dll
-                        "score_selected",
-                        "score_compare",
-                        "diff_abs",
-                        "diff_pct",
-                    ]
-                ].copy()
+    with tab1:
+        _render_tab_overview(df_af, aff_row, selected_affiliation)
 
-                st.caption(f"score_selected = {aff_a}  |  score_compare = {aff_b}")
+    with tab2:
+        _render_tab_profile(
+            cat_pivot, per_cat_views, cluster_key, aff_row, selected_affiliation
+        )
 
-                styler = (
-                    df_show.style
-                    .format(
-                        {
-                            "score_selected": "{:,.2f}",
-                            "score_compare": "{:,.2f}",
-                            "diff_abs": "{:,.2f}",
-                            "diff_pct": "{:,.2f}%",
-                        }
-                    )
-                    .apply(color_diff, axis=1)
-                )
+    with tab3:
+        _render_tab_high_leverage(df_detail, cat_pivot, cluster_key, selected_affiliation)
 
-                st.dataframe(styler, use_container_width=True, height=600)
+    with tab4:
+        _render_tab_metrics_detail(df_md, code_cat_map, md_keys, selected_affiliation)
+
+    with tab5:
+        _render_tab_compare(df_md, md_key, affiliations, default_aff, md_keys)
 
 
 if __name__ == "__main__":